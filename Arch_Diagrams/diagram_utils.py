@@ -0,0 +1,203 @@
+"""
+Shared helpers for the architecture diagram scripts
+
+Draw.io conversion is batched: scripts queue their DOT files with
+queue_drawio() and they are converted when the interpreter exits (or on
+flush_drawio()) through graphviz2drawio's Python API, in-process, instead
+of spawning the graphviz2drawio CLI for each diagram.
+
+Diagram is a drop-in diagrams.Diagram that renders all of its output
+formats with a single `dot` process, so the graph is laid out once.
+
+Rendered files are cached in diagrams/.cache/, keyed on a hash of their
+inputs, so re-running a script whose diagram hasn't changed skips GraphViz
+and graphviz2drawio entirely.
+"""
+
+import atexit
+import functools
+import glob
+import hashlib
+import importlib.metadata
+import os
+import shutil
+import subprocess
+
+# Set before diagrams/graphviz are imported and inherited by every `dot` run:
+# a headless matplotlib backend and a fixed fontconfig setup so Pango doesn't
+# rescan fonts on each render (run `fc-cache -f` once after installing fonts)
+os.environ.setdefault("MPLBACKEND", "Agg")
+if os.name != "nt":
+    if os.path.isdir("/etc/fonts"):
+        os.environ.setdefault("FONTCONFIG_PATH", "/etc/fonts")
+    os.environ.setdefault("PANGOCAIRO_BACKEND", "fc")
+
+import diagrams  # noqa: E402
+from graphviz import ExecutableNotFound, view  # noqa: E402
+
+CACHE_DIR = os.path.join("diagrams", ".cache")
+
+_PENDING_DOT_FILES: list[str] = []
+
+# diagrams.Node rebuilds the absolute icon path from its own __file__ for
+# every node; resolve each (dir, icon) pair once instead. Subclasses that
+# override _load_icon (e.g. diagrams.custom.Custom) are unaffected.
+_RESOURCES_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(diagrams.__file__)))
+
+
+@functools.cache
+def _icon_path(icon_dir, icon):
+    return os.path.join(_RESOURCES_ROOT, icon_dir, icon)
+
+
+def _load_icon(self):
+    return _icon_path(self._icon_dir, self._icon)
+
+
+diagrams.Node._load_icon = _load_icon
+
+
+def _hash_bytes(*chunks):
+    h = hashlib.blake2b()
+    for chunk in chunks:
+        h.update(chunk)
+    return h.hexdigest()[:16]
+
+
+def _cache_path(key, path):
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return os.path.join(CACHE_DIR, f"{stem}.{key}{ext}")
+
+
+def source_key(script_path, *settings):
+    """Hash a diagram script, these helpers and any settings that change its output.
+
+    The installed diagrams version and its resources folder are always part
+    of the key: rendered files embed absolute icon paths, so a rebuilt,
+    moved or upgraded venv must not restore them.
+    """
+    sources = []
+    for path in (script_path, __file__):
+        with open(path, "rb") as f:
+            sources.append(f.read())
+    settings += (importlib.metadata.version("diagrams"), _RESOURCES_ROOT)
+    return _hash_bytes(*sources, *(repr(s).encode() for s in settings))
+
+
+def restore_cached(key, outputs):
+    """Copy cached renders for key into place; False if any are missing."""
+    cached = [_cache_path(key, path) for path in outputs]
+    if not all(os.path.exists(path) for path in cached):
+        return False
+    for src, dst in zip(cached, outputs):
+        shutil.copy(src, dst)
+    return True
+
+
+def store_cached(key, outputs):
+    """Save freshly rendered outputs in the cache under key.
+
+    Only the latest render of each output is kept. Any older key found for
+    one of the outputs is evicted with all of its files, so e.g. a PNG left
+    behind after toggling SKIP_PNG doesn't linger without its DOT.
+    """
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    for path in outputs:
+        stem, ext = os.path.splitext(os.path.basename(path))
+        prefix = glob.escape(os.path.join(CACHE_DIR, stem + "."))
+        for old in glob.glob(prefix + "*" + ext):
+            old_key = os.path.basename(old)[len(stem) + 1:-len(ext)]
+            if old_key != key:
+                for stale in glob.glob(prefix + glob.escape(old_key) + ".*"):
+                    os.remove(stale)
+        shutil.copy(path, _cache_path(key, path))
+
+
+class Diagram(diagrams.Diagram):
+    """diagrams.Diagram that renders every output format in one dot run.
+
+    The stock render() calls `dot` once per entry in outformat and each call
+    repeats the full layout. `dot` accepts several -T/-o pairs, so ask for all
+    formats at once and lay the graph out a single time. This also beats
+    running one `dot` per format in parallel threads: each of those would
+    redo the layout, and emitting the extra formats after it is cheap.
+
+    The DOT source is streamed to `dot` on stdin, so no intermediate source
+    file is written and re-read.
+    """
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        # diagrams.Diagram.__exit__ minus deleting the source file we never wrote
+        self.render()
+        diagrams.setdiagram(None)
+
+    def render(self):
+        formats = self.outformat if isinstance(self.outformat, list) else [self.outformat]
+        args = ["dot"]
+        for fmt in formats:
+            args += [f"-T{fmt}", "-o", f"{self.filename}.{fmt}"]
+        try:
+            # Like the stock render(quiet=True), keep dot's warnings (e.g. "size
+            # too small for label") off the console unless the render fails
+            proc = subprocess.run(args, input=self.dot.source, stderr=subprocess.PIPE,
+                                  encoding="utf-8")
+        except FileNotFoundError as e:
+            raise ExecutableNotFound(args) from e
+        if proc.returncode:
+            print(proc.stderr, end="")
+            raise subprocess.CalledProcessError(proc.returncode, args, stderr=proc.stderr)
+        if self.show:
+            view(f"{self.filename}.{formats[0]}")
+
+
+def queue_drawio(dot_path):
+    """Queue a DOT file to be converted to Draw.io on exit."""
+    _PENDING_DOT_FILES.append(dot_path)
+
+
+def flush_drawio():
+    """Convert every queued DOT file to Draw.io in this process.
+
+    Returns the paths of the .drawio files that were written or restored
+    from the cache; failed conversions are reported and left out.
+    """
+    if not _PENDING_DOT_FILES:
+        return []
+    dot_files = list(_PENDING_DOT_FILES)
+    _PENDING_DOT_FILES.clear()
+
+    try:
+        from graphviz2drawio import graphviz2drawio
+    except ImportError:
+        print("✗ graphviz2drawio not found. Install with: pip install graphviz2drawio")
+        return []
+
+    # graphviz2drawio's default; pygraphviz only runs standalone programs such
+    # as dot or nop here, not -K engines like nop2
+    layout_prog = "dot"
+    # A new layout program or converter release must not reuse old exports
+    settings = f"{layout_prog}:{importlib.metadata.version('graphviz2drawio')}".encode()
+
+    drawio_files = []
+    for dot_path in dot_files:
+        drawio_path = os.path.splitext(dot_path)[0] + ".drawio"
+        with open(dot_path, "rb") as f:
+            key = _hash_bytes(f.read(), settings)
+        if restore_cached(key, [drawio_path]):
+            print(f"✓ Draw.io file restored from cache: {drawio_path}")
+            drawio_files.append(drawio_path)
+            continue
+        try:
+            xml = graphviz2drawio.convert(dot_path, layout_prog)
+        except Exception as e:
+            print(f"✗ Failed to convert {dot_path} to Draw.io format: {e}")
+            continue
+        with open(drawio_path, "w", encoding="utf-8") as f:
+            f.write(xml)
+        store_cached(key, [drawio_path])
+        print(f"✓ Draw.io file generated: {drawio_path}")
+        drawio_files.append(drawio_path)
+    return drawio_files
+
+
+atexit.register(flush_drawio)
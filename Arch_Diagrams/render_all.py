@@ -0,0 +1,43 @@
+"""
+Render every architecture diagram in parallel
+
+Each diagram script exposes a build_*() function; this driver runs them in a
+process pool so the GraphViz `dot` renders use all available cores instead of
+running one after another.
+
+Usage: python render_all.py
+"""
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from bicep_iis_sql_diagram import build_bicep
+from contoso_architecture import build_contoso
+from diagram_utils import flush_drawio, queue_drawio
+
+BUILDERS = [build_bicep, build_contoso]
+
+
+def _call(build):
+    # Convert inside the worker so Draw.io exports also run in parallel
+    queue_drawio(build())
+    return flush_drawio()
+
+
+def render_all():
+    """Run every diagram builder, and its Draw.io export, in a worker process.
+
+    Returns the .drawio files produced by each builder, in BUILDERS order.
+    """
+    with ProcessPoolExecutor(max_workers=os.cpu_count()) as ex:
+        return list(ex.map(_call, BUILDERS))
+
+
+if __name__ == "__main__":
+    # Output paths in the builders are relative to this folder
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    results = render_all()
+    print(f"\n✓ Rendered {len(BUILDERS)} diagrams into diagrams/")
+    failed = [build.__name__ for build, drawio_files in zip(BUILDERS, results) if not drawio_files]
+    if failed:
+        print(f"✗ Draw.io export failed for: {', '.join(failed)}")